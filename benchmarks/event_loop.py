@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Compare latency of the launch and search paths across event loops.
+
+A stand-in for Glossia answers calls over a local socket, so that each call
+makes a real round trip through the event loop, as it would through the
+router. Run from the repository root:
+
+    python3 benchmarks/event_loop.py [--iterations N] [--simulations N]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import txaio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import glot.actions  # noqa: E402
+import glot.connector  # noqa: E402
+
+# Search responses for many simulations run to megabytes on one line
+_stream_limit = 2 ** 26
+
+_gssa_xml = """<?xml version="1.0"?>
+<simulationDefinition>
+  <transferrer method="http"/>
+  <definition family="elmer-libnuma"/>
+</simulationDefinition>
+"""
+
+
+def make_definitions(count):
+    return {
+        '%032X' % i: {
+            'finalized': True,
+            'status': {'percentage': i % 100, 'message': 'Step %d' % i, 'timestamp': 1.5e9 + i},
+            'exit_status': [True, 'SUCCESS'] if i % 3 else None
+        }
+        for i in range(count)
+    }
+
+
+async def serve(definitions, handlers):
+    async def handle(reader, writer):
+        handlers.append(asyncio.current_task())
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            suffix = json.loads(line)[0]
+            response = definitions if suffix == 'search' else True
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', 0, limit=_stream_limit)
+
+
+async def measure(iterations, simulations, directory):
+    handlers = []
+    server = await serve(make_definitions(simulations), handlers)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=_stream_limit)
+
+    async def make_call(suffix, *args, minapi='A0.0'):
+        writer.write(json.dumps([suffix] + list(args)).encode('utf-8') + b'\n')
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    actor = glot.actions.GlotActor(False, False, None, False, False)
+    actor.set_log(txaio.make_logger())
+    actor.set_make_call(make_call)
+
+    xml = os.path.join(directory, 'original.xml')
+    with open(xml, 'w') as f:
+        f.write(_gssa_xml)
+    definition = os.path.join(directory, 'start.sif')
+    surface = os.path.join(directory, 'surface.vtp')
+    for filename in definition, surface:
+        with open(filename, 'wb') as f:
+            f.write(os.urandom(2 ** 16))
+
+    timings = {'launch': [], 'search': []}
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await actor.launch(xml, '.', directory, (surface,), (definition,))
+        timings['launch'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await actor.search(10, simulations, 'timestamp', None)
+        timings['search'].append(time.perf_counter() - start)
+
+    writer.close()
+    await writer.wait_closed()
+    await asyncio.gather(*handlers)
+    server.close()
+    await server.wait_closed()
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--simulations', type=int, default=1000)
+    args = parser.parse_args()
+
+    txaio.use_asyncio()
+
+    for name, use_uvloop in (('asyncio', False), ('uvloop', True)):
+        if use_uvloop:
+            try:
+                import uvloop  # noqa: F401
+            except ImportError:
+                print("uvloop: not installed")
+                continue
+
+        with tempfile.TemporaryDirectory() as directory:
+            timings = glot.connector.run(measure(args.iterations, args.simulations, directory), use_uvloop)
+
+        for path, samples in timings.items():
+            samples.sort()
+            print("%-8s %-7s mean %7.3lfms  p50 %7.3lfms  p99 %7.3lfms" % (
+                name,
+                path,
+                1e3 * statistics.mean(samples),
+                1e3 * samples[len(samples) // 2],
+                1e3 * samples[int(len(samples) * 0.99)]
+            ))
+
+
+if __name__ == '__main__':
+    main()
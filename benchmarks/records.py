@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Measure per-row cost of decoding, sorting and rendering search results.
+
+Run from the repository root:
+
+    python3 benchmarks/records.py [--rows 1000 10000 100000] [--limit N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import txaio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import glot.actions  # noqa: E402
+import glot.connector  # noqa: E402
+import glot.records  # noqa: E402
+
+
+def make_definitions(count):
+    return {
+        '%032X' % i: {
+            'finalized': bool(i % 7),
+            'status': None if i % 11 == 0 else {
+                'percentage': 'n/a' if i % 13 == 0 else (i % 1000) / 10.,
+                'message': 'Step %d\nof the solver' % i,
+                'timestamp': 1.5e9 + (i * 7919) % count
+            },
+            'exit_status': [True, 'SUCCESS'] if i % 3 else None
+        }
+        for i in range(count)
+    }
+
+
+def timed(f, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    txaio.use_asyncio()
+
+    print("%8s  %-22s %12s %12s" % ('rows', 'path', 'total (ms)', 'per row (ns)'))
+
+    for rows in args.rows:
+        definitions = make_definitions(rows)
+
+        def search(fmt):
+            async def make_call(suffix, *call_args, minapi='A0.0'):
+                return definitions
+
+            actor = glot.actions.GlotActor(False, False, None, False, False)
+            actor.set_log(txaio.make_logger())
+            actor.set_make_call(make_call)
+
+            def run():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    glot.connector.run(actor.search(args.limit, rows, 'timestamp', None, fmt=fmt))
+            return run
+
+        paths = [
+            ('decode', lambda: glot.records.decode_definitions(definitions)),
+            ('decode+select', lambda: glot.records.select(
+                glot.records.decode_definitions(definitions), 'timestamp', args.limit
+            )),
+            ('search (table)', search('table')),
+            ('search (jsonl)', search('jsonl')),
+        ]
+
+        for name, f in paths:
+            elapsed = timed(f, args.repeat)
+            print("%8d  %-22s %12.2lf %12.0lf" % (rows, name, 1e3 * elapsed, 1e9 * elapsed / rows))
+
+
+if __name__ == '__main__':
+    main()
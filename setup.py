@@ -15,8 +15,10 @@ setup(
         'scripts/glot',
     ],
 
+    python_requires='>=3.7',
+
     install_requires=[
-        'aiohttp',
+        'aiohttp>=3.3',
         'txaio',
         'Click>=6.0',
         'gitpython',
@@ -24,5 +26,11 @@ setup(
         'colorama',
         'glossia.comparator',
         'docker-compose>=1.5'
-    ]
+    ],
+
+    extras_require={
+        'uvloop': ['uvloop'],
+        'arrow': ['pyarrow'],
+        'summary': ['numpy', 'pyarrow']
+    }
 )
@@ -1,4 +1,5 @@
 import datetime
+import io
 import traceback
 import tabulate
 import colorama as C
@@ -10,10 +11,17 @@ import shutil
 import lxml.etree
 import tempfile
 import stat
+import time
 import yaml
 import uuid
+from autobahn.wamp.exception import ApplicationError
 
 import glot.transfer
+import glot.cache
+import glot.output
+import glot.records
+import glot.scheduler
+import glot.summary
 
 try:
     from glossia.comparator.parse import gssa_xml_to_definition
@@ -21,21 +29,80 @@ except:
     print("WARNING: could not import glossia.comparator - functionality may be limited")
     gssa_xml_to_definition = None
 
+
+def _comparator_version():
+    """Installed version of glossia.comparator, so cached definitions are
+    not served from an older parser"""
+    try:
+        from importlib.metadata import version
+    except ImportError:
+        # Python 3.7
+        try:
+            import pkg_resources
+            return pkg_resources.get_distribution('glossia.comparator').version
+        except Exception:
+            return None
+
+    try:
+        return version('glossia.comparator')
+    except Exception:
+        return None
+
+
 _repo_locations = {
     'fenics': 'https://github.com/go-smart/glossia-container-fenics-control',
     'elmer-libnuma': 'https://github.com/go-smart/glossia-container-goosefoot-control'
 }
 
 
+def _archive_entry(member):
+    """Normalise a launch member to (arcname, filename, fileobj, size)"""
+    if isinstance(member, (str, os.PathLike)):
+        member = os.fspath(member)
+        size = os.path.getsize(member) if os.path.isfile(member) else None
+        return os.path.basename(member), member, None, size
+
+    if isinstance(member, tuple):
+        name, data = member
+    else:
+        name, data = member.name, member
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = io.BytesIO(data)
+
+    # Tar headers precede the content, so we need the size up front - where
+    # we cannot seek, we must hold the rest of the stream in memory
+    if hasattr(data, 'seekable') and data.seekable():
+        position = data.tell()
+        size = data.seek(0, io.SEEK_END) - position
+        data.seek(position)
+    else:
+        data = io.BytesIO(data.read())
+        size = len(data.getvalue())
+
+    return os.path.basename(name), None, data, size
+
+
 class GlotActor:
     _log = None
 
-    def __init__(self, verbose, force, destination, color, debug):
+    def __init__(self, verbose, force, destination, color, debug, shared_path=None, stall_timeout=None,
+                 cache_size=None, transfer_host=None, transfer_ports=None, router='localhost'):
         self._verbose = verbose
         self._force = force
         self._destination = destination
         self._color = color
         self._debug = debug
+        self._shared = glot.transfer.SharedDirectory.parse(shared_path) if shared_path else None
+        self._stall_timeout = stall_timeout
+        self._definition_cache = None
+        self._results_cache = glot.cache.ResultsCache(cache_size) if cache_size else None
+        self._transfer = None
+        self._transfer_settings = {
+            'host': transfer_host,
+            'ports': transfer_ports,
+            'route_to': router
+        }
 
     def has_log(self):
         return self._log is not None
@@ -46,13 +113,12 @@ class GlotActor:
     def set_make_call(self, mc):
         self._mc = mc
 
-    @asyncio.coroutine
-    def logs(self, guid, stdout):
+    async def logs(self, guid, stdout):
         log = self._log
         mc = self._mc
 
         handle = 'stdout' if stdout else 'stderr'
-        logs = yield from mc('logs', guid.upper(), handle)
+        logs = await mc('logs', guid.upper(), handle)
 
         log.debug('Returned from logs call')
 
@@ -61,61 +127,94 @@ class GlotActor:
         else:
             print("No logs could be retrieved")
 
-    @asyncio.coroutine
-    def cancel(self, guid):
+    async def cancel(self, guid):
         log = self._log
         mc = self._mc
 
-        success = yield from mc('cancel', guid.upper())
+        success = await mc('cancel', guid.upper())
 
         if success:
             log.info('Cancelled [%s]' % guid)
         else:
             log.error('Could not cancel [%s]' % guid)
 
-    @asyncio.coroutine
-    def launch(self, gssa_xml, tmp_subdirectory, tmp_directory, input_files, definition_files):
+    def _write_archive(self, directory, members, label):
+        """Tar the members straight into a new, compressed archive in the
+        transferrer directory, returning its path.
+
+        Members may be filenames, file-like objects with a name, or
+        (name, bytes or file-like) pairs for content held in memory.
+        """
+        log = self._log
+
+        entries = [_archive_entry(member) for member in members]
+        total = sum(size for _, _, _, size in entries if size)
+        progress = glot.transfer.TransferProgress(label, total)
+
+        fd, archive = tempfile.mkstemp(suffix='.tar.gz', dir=directory)
+        with os.fdopen(fd, 'wb') as f, tarfile.open(fileobj=f, mode='w:gz') as tar:
+            for arcname, filename, fileobj, size in entries:
+                if filename is not None:
+                    info = tar.gettarinfo(filename, arcname)
+                    if info.isreg():
+                        with open(filename, 'rb') as g:
+                            tar.addfile(info, glot.transfer.CountingReader(g, progress))
+                    else:
+                        tar.add(filename, arcname)
+                else:
+                    info = tarfile.TarInfo(arcname)
+                    info.size = size
+                    info.mtime = time.time()
+                    info.mode = 0o644
+                    tar.addfile(info, glot.transfer.CountingReader(fileobj, progress))
+                log.debug("Added [%s]" % arcname)
+
+        progress.finish()
+
+        # Note that this makes the file global readable - we assume the
+        # parent of the tmp directory is used to control permissions
+        os.chmod(archive, stat.S_IROTH | stat.S_IRGRP | stat.S_IRUSR)
+
+        log.debug("Made temporary tar at %s" % archive)
+        return archive
+
+    async def launch(self, gssa_xml, tmp_subdirectory, tmp_directory, input_files, definition_files):
+        if isinstance(gssa_xml, (bytes, bytearray)):
+            gssa_xml = io.BytesIO(gssa_xml)
         gssa = lxml.etree.parse(gssa_xml)
         log = self._log
         mc = self._mc
 
+        # Where we share a directory with the server, it can read archives
+        # straight from our side of it, unless told to write them elsewhere
+        shared = self._shared
+        if tmp_directory is None:
+            tmp_directory = shared.local if shared is not None else os.path.join('/tmp', 'gssa-transferrer')
+
+        if shared is not None and os.path.abspath(tmp_directory) == shared.local:
+            remote_directory = shared.remote
+        else:
+            remote_directory = os.path.join('/tmp', 'gssa-transferrer')
+
+        archives = []
+
         # We tar the definition files into one object for transferring and add
         # it to the definition node
         if definition_files:
-            definition_tmp = tempfile.NamedTemporaryFile(suffix='.tar.gz', dir=tmp_directory, delete=False)
-            definition_tar = tarfile.open(fileobj=definition_tmp, mode='w:gz')
-            for definition_file in definition_files:
-                definition_tar.add(definition_file, os.path.basename(definition_file))
-                log.debug("Added [%s]" % os.path.basename(definition_file))
-            definition_tar.close()
-            definition_tmp.close()
-
-            # Note that this makes the file global readable - we assume the
-            # parent of the tmp directory is used to control permissions
-            os.chmod(definition_tmp.name, stat.S_IROTH | stat.S_IRGRP | stat.S_IRUSR)
-
-            log.debug("Made temporary tar at %s" % definition_tmp.name)
+            archive = self._write_archive(tmp_directory, definition_files, 'Packing definition')
+            archives.append(archive)
+
             definition_node = gssa.find('.//definition')
-            location_remote = os.path.join('/tmp', 'gssa-transferrer', os.path.basename(definition_tmp.name))
+            location_remote = os.path.join(remote_directory, os.path.basename(archive))
             definition_node.set('location', location_remote)
 
         # Do the same with the input surfaces
         if input_files:
-            input_tmp = tempfile.NamedTemporaryFile(suffix='.tar.gz', dir=tmp_directory, delete=False)
-            input_tar = tarfile.open(fileobj=input_tmp, mode='w:gz')
-            for input_file in input_files:
-                input_tar.add(input_file, os.path.basename(input_file))
-                log.debug("Added [%s]" % os.path.basename(input_file))
-            input_tar.close()
-            input_tmp.close()
-
-            # Note that this makes the file global readable - we assume the
-            # parent of the tmp directory is used to control permissions
-            os.chmod(input_tmp.name, stat.S_IROTH | stat.S_IRGRP | stat.S_IRUSR)
-
-            log.debug("Made temporary tar at %s" % input_tmp.name)
+            archive = self._write_archive(tmp_directory, input_files, 'Packing input')
+            archives.append(archive)
+
             input_node = lxml.etree.SubElement(gssa.find('.//transferrer'), 'input')
-            location_remote = os.path.join('/tmp', 'gssa-transferrer', os.path.basename(input_tmp.name))
+            location_remote = os.path.join(remote_directory, os.path.basename(archive))
             input_node.set('location', location_remote)
 
         # Generate a simulation ID
@@ -124,69 +223,267 @@ class GlotActor:
         # Run the simulation
         guid = str(guid)
         gssa_string = lxml.etree.tostring(gssa, encoding="unicode")
-        yield from mc('init', guid)
+        await mc('init', guid)
         log.info("Initiated...")
-        yield from mc('update_settings_xml', guid, gssa_string)
+        await mc('update_settings_xml', guid, gssa_string)
         log.info("Sent XML...")
-        yield from mc('finalize', guid, tmp_subdirectory)
+        await mc('finalize', guid, tmp_subdirectory)
         log.info("Finalized settings...")
-        yield from mc('start', guid)
+        await mc('start', guid)
         log.info("Started.")
 
         # These may already have been removed
-        for tmp in definition_tmp, input_tmp:
+        for archive in archives:
             try:
-                os.unlink(tmp.name)
+                os.unlink(archive)
             except OSError:
                 pass
 
-    @asyncio.coroutine
-    def status(self, guid):
+        return guid
+
+    def queue_add(self, queue, priority, gssa_xml, tmp_subdirectory, tmp_directory, input_files, definition_files):
+        log = self._log
+
+        entry_id = queue.add(priority, gssa_xml, tmp_subdirectory, tmp_directory, input_files, definition_files)
+        log.info("Queued launch %d of %s (priority %d)" % (entry_id, gssa_xml, priority))
+
+    def queue_list(self, queue):
+        table = [
+            [
+                e['id'],
+                e['priority'],
+                datetime.datetime.fromtimestamp(e['queued']).strftime('%A %d, %B %Y :: %H:%M:%S'),
+                e['gssa_xml']
+            ]
+            for e in queue.entries()
+        ]
+
+        print(tabulate.tabulate(table, headers=['ID', 'Priority', 'Queued', 'GSSA-XML']))
+
+    async def _running(self, server_limit):
+        """Count simulations that have been set up on the server, but
+        have not yet exited."""
+        definitions = await self._mc('search', '', server_limit)
+        records = glot.records.decode_definitions(definitions, self._log)
+
+        return sum(1 for r in records if r.running)
+
+    async def queue_run(self, queue, concurrency, interval, server_limit, watch,
+                        max_attempts=glot.scheduler._default_attempts):
+        """Launch queued simulations, in priority order, while the server
+        has fewer than `concurrency` running. Entries that fail to launch
+        are retried on later rounds, up to `max_attempts` times."""
+        log = self._log
+
+        while True:
+            entries = queue.entries()
+
+            if entries:
+                running = await self._running(server_limit)
+                admit = entries[:max(concurrency - running, 0)]
+
+                if admit:
+                    log.info("%d running - admitting %d of %d queued" % (running, len(admit), len(entries)))
+
+                for entry in admit:
+                    # One bad entry must not hold up the rest of the queue
+                    try:
+                        guid = await self.launch(
+                            entry['gssa_xml'],
+                            entry['tmp_subdirectory'],
+                            entry['tmp_directory'],
+                            entry['input_files'],
+                            entry['definition_files']
+                        )
+                    except Exception as e:
+                        error = "%s: %s" % (type(e).__name__, e)
+                        if queue.fail(entry['id'], error, max_attempts):
+                            log.error("Dropping queue entry %d (%s) - %s" % (entry['id'], entry['gssa_xml'], error))
+                        else:
+                            log.warn("Could not launch queue entry %d, will retry - %s" % (entry['id'], error))
+                        continue
+
+                    queue.remove(entry['id'])
+                    log.info("Launched queue entry %d as [%s]" % (entry['id'], guid))
+            elif not watch:
+                log.info("Queue is empty")
+                return
+
+            await asyncio.sleep(interval)
+
+    async def status(self, guid, fmt='table'):
         log = self._log
         mc = self._mc
 
-        simulation = yield from mc('retrieve_status', guid.upper())
+        simulation = await mc('retrieve_status', guid.upper())
 
         if not simulation:
             log.error('Simulation [%s] not found' % guid)
+        elif fmt != 'table':
+            # Decoded as for search, so the fields are flat and the same
+            records = glot.records.decode_definitions({guid.upper(): simulation}, log)
+            glot.output.write_records((r._asdict() for r in records), glot.records.SimulationRecord.fields, fmt)
         else:
             table = simulation.items()
             print(tabulate.tabulate(table))
 
-    @asyncio.coroutine
-    def results(self, guid, target, include_diagnostic, inspect_diagnostic):
+    async def _completion(self, guid):
+        """Resolve a GUID (prefix) to the full GUID and completion timestamp
+        of a finished simulation, or None if it is not finished."""
+        # This only lets us use the cache, so a refusal is not fatal
+        try:
+            definitions = await self._mc('search', guid.upper(), 2)
+        except ApplicationError as e:
+            self._log.debug("Could not check completion of [%s]: %s" % (guid, e))
+            return None
+        records = glot.records.decode_definitions(definitions, self._log)
+
+        if len(records) != 1:
+            return None
+
+        record = records[0]
+        if not record.exited or not record.timestamp:
+            return None
+
+        return record.guid, record.timestamp
+
+    async def _request_archive(self, call, guid, target, filename, consumer=None):
+        """Ask the server to push an archive, returning its response and,
+        if we received the archive locally, its filename.
+
+        Archives of finished simulations are kept in the results cache, so
+        asking again is answered locally.
+        """
         log = self._log
         mc = self._mc
 
-        filename = None
-        include_diagnostic = include_diagnostic or inspect_diagnostic
+        if target is not None:
+            response = await mc(call, guid.upper(), target)
+            return response, None
 
-        if target is None:
-            log.warn(
-                "No target given, assuming we should provide "
-                "a target for a local Glossia"
-            )
-            srv = yield from glot.transfer.OneFileHttpServer.make(log, '%s-results.tgz' % guid)
-        else:
-            srv = None
+        cache = self._results_cache
+        artifact = call[len('request_'):]
+
+        completion = await self._completion(guid) if cache else None
+        if completion:
+            full_guid, completed = completion
+            cached, response = cache.get(full_guid, artifact, completed)
+            if cached:
+                log.info("Using cached %s for [%s]" % (artifact, full_guid))
+                glot.cache.copy_file(cached, filename)
+                return response, filename
 
-        success = yield from mc('request_results', guid.upper(), target)
+        response, received = await self._receive_archive(call, guid, filename, consumer)
 
-        if not success:
-            log.error('Simulation not found')
+        if completion and received:
+            cache.put(full_guid, artifact, completed, received, response)
+
+        return response, received
+
+    async def _transfer_server(self):
+        # One server receives every upload we are expecting at the time
+        if self._transfer is None:
+            self._transfer = await glot.transfer.TransferServer.make(self._log, **self._transfer_settings)
+        return self._transfer
+
+    async def _release_transfer_server(self):
+        if self._transfer is not None and self._transfer.idle():
+            transfer, self._transfer = self._transfer, None
+            await transfer.close()
+
+    async def _receive_archive(self, call, guid, filename, consumer=None):
+        log = self._log
+        mc = self._mc
 
-        if srv is not None:
-            if success:
-                filename = yield from srv.wait()
-            yield from srv.close()
+        shared = self._shared
+        if shared is not None:
+            shared.discard(filename)
+            try:
+                response = await mc(
+                    call,
+                    guid.upper(),
+                    shared.target(filename),
+                    minapi=glot.transfer._shared_path_minapi
+                )
+            except NotImplementedError:
+                log.warn("Server does not support shared-path transfers, falling back to HTTP")
+            else:
+                if not response:
+                    return response, None
+
+                received = await shared.claim(filename, stall_timeout=self._stall_timeout)
+                if received:
+                    log.debug("Received %s through shared directory" % received)
+                    return response, received
+
+                log.warn("Archive did not appear in shared directory, falling back to HTTP")
+
+        log.warn(
+            "No target given, assuming we should provide "
+            "a target for a local Glossia"
+        )
+        srv = await self._transfer_server()
+        upload = srv.expect(filename)
+        if consumer is not None:
+            upload.consumers.append(consumer)
+
+        received = None
+        try:
+            response = await mc(call, guid.upper(), upload.target)
+
+            if response:
+                received = await upload.wait(self._stall_timeout)
+        finally:
+            upload.cancel()
+            await self._release_transfer_server()
+
+        return response, received
+
+    async def results(self, guid, target, include_diagnostic, inspect_diagnostic, summary_format=None):
+        log = self._log
 
-        if not target and not self._destination:
-            self._destination = '.'
+        include_diagnostic = include_diagnostic or inspect_diagnostic
+        filename = '%s-results.tgz' % guid
+
+        # Where the archive comes over HTTP, we summarize it as it arrives
+        stream = None
+        if summary_format and target:
+            log.warn("Not summarizing - results pushed to a target are not received locally")
+        elif summary_format:
+            summary = glot.summary.summary_filename(filename, summary_format)
+            stream = glot.summary.StreamingSummary(guid, summary, summary_format, log)
+
+        try:
+            success, filename = await self._request_archive(
+                'request_results',
+                guid,
+                target,
+                filename,
+                consumer=(stream.feed if stream else None)
+            )
 
+            if not success:
+                log.error('Simulation not found')
+            elif stream is not None and filename:
+                if stream.started:
+                    count = await stream.finish()
+                else:
+                    count = glot.summary.summarize_archive(filename, guid, summary, summary_format, log)
+                log.info("Summarized %d arrays into %s" % (count, summary))
+        finally:
+            # However the transfer ended, the summary's thread must not wait
+            # for the rest of the archive forever
+            if stream is not None:
+                await stream.close()
+
+        # The actor may serve further commands (e.g. in a shell), so this
+        # default must not outlive the call
         destination = self._destination
+        if not target and not destination:
+            destination = '.'
 
         if include_diagnostic:
-            yield from self.diagnostic(guid, target, inspect_diagnostic)
+            await self.diagnostic(guid, target, inspect_diagnostic, destination)
 
         if not target and inspect_diagnostic:
             os.makedirs(destination, exist_ok=True)
@@ -212,13 +509,19 @@ class GlotActor:
                 
                 safe_extract(f, path=destination)
 
-    @asyncio.coroutine
-    def search(self, limit, server_limit, sort, guid, fancy=False):
+    async def search(self, limit, server_limit, sort, guid, fancy=False, fmt='table'):
         log = self._log
         mc = self._mc
         color = self._color
 
-        definitions = yield from mc('search', guid.upper() if guid else '', server_limit)
+        definitions = await mc('search', guid.upper() if guid else '', server_limit)
+
+        records = glot.records.decode_definitions(definitions, log)
+        records = glot.records.select(records, sort, limit)
+
+        if fmt != 'table':
+            glot.output.write_records((r._asdict() for r in records), glot.records.SimulationRecord.fields, fmt)
+            return
 
         headers = [
             'GUID',
@@ -229,44 +532,17 @@ class GlotActor:
             'Completed'
         ]
 
-        for d in definitions.values():
-            if d['status']:
-                try:
-                    float(d['status']['percentage'])
-                except:
-                    d['status']['percentage'] = False
-
-        g, d = "", ""
-        table = []
-        for g, d in definitions.items():
-            if not d:
-                raise Exception("Empty definition!")
-            try:
-                status = d['status'] if d['status'] else {'percentage': False, 'message': None, 'timestamp': None}
-                d['status'] = status
-
-                table.append([
-                    g,
-                    'Y' if d['finalized'] else 'N',
-                    '' if not status['timestamp'] else datetime.datetime.fromtimestamp(status['timestamp']).strftime('%A %d, %B %Y :: %H:%M:%S'),
-                    '' if not status['percentage'] else ("%.2lf" % status['percentage']),
-                    '' if not status['message'] else status['message'].replace('\n', ' ')[0:60],
-                    '-' if not d['exit_status'] else ('Y' if d['exit_status'][0] in (True, 'SUCCESS') else 'N')
-                ])
-            except Exception as e:
-                log.error('Could not format status for a simulation')
-                log.error(str(e))
-                log.error(g)
-                # Work around txaio's {} parsing
-                log.error(str(d).replace('{', '[').replace('}', ']'))
-
-        if sort == 'timestamp':
-            table.sort(key=lambda r: -definitions[r[0]]['status']['timestamp'] if definitions[r[0]]['status']['timestamp'] else 0)
-        elif sort == 'guid':
-            table.sort(key=lambda r: r[0])
-
-        if limit:
-            table = table[:limit]
+        table = [
+            [
+                r.guid,
+                'Y' if r.finalized else 'N',
+                '' if not r.timestamp else datetime.datetime.fromtimestamp(r.timestamp).strftime('%A %d, %B %Y :: %H:%M:%S'),
+                '' if not r.percentage else ("%.2lf" % r.percentage),
+                '' if not r.message else r.message.replace('\n', ' ')[0:60],
+                '-' if not r.exited else ('Y' if r.success else 'N')
+            ]
+            for r in records
+        ]
 
         if color:
             ce = {'-': C.Fore.YELLOW, 'Y': C.Fore.GREEN, 'N': C.Fore.RED}
@@ -274,37 +550,17 @@ class GlotActor:
 
         print(tabulate.tabulate(table, headers=headers, tablefmt=('fancy_grid' if fancy else 'simple')))
 
-    @asyncio.coroutine
-    def diagnostic(self, guid, target, inspect):
+    async def diagnostic(self, guid, target, inspect, destination=None):
         log = self._log
-        mc = self._mc
-
-        filename = None
 
-        if target is None:
-            log.warn(
-                "No target given, assuming we should provide "
-                "a target for a local Glossia"
-            )
-            srv = yield from glot.transfer.OneFileHttpServer.make(log, '%s-diagnostic.tgz' % guid)
-        else:
-            srv = None
-
-        files = yield from mc('request_diagnostic', guid.upper(), target)
-
-        if srv is not None:
-            if files:
-                filename = yield from srv.wait()
-            else:
-                srv.cancel()
-            srv.close()
+        files, filename = await self._request_archive('request_diagnostic', guid, target, '%s-diagnostic.tgz' % guid)
 
         if files:
             log.info("FILES:\n\t%s" % "\n\t".join(["[%s]: [%s]" % t for t in files.items()]))
         else:
             log.warn("No simulation diagnostics found")
 
-        to = self._destination if not target else None
+        to = (destination if destination else self._destination) if not target else None
         if inspect:
             log.debug("Inspect")
             if filename is None:
@@ -327,6 +583,25 @@ class GlotActor:
 
         return filename
 
+    def extract_summary(self, archives, fmt='npz'):
+        log = self._log
+        force = self._force
+
+        for archive in archives:
+            guid = glot.summary.archive_guid(archive)
+            summary = glot.summary.summary_filename(archive, fmt)
+
+            if self._destination:
+                os.makedirs(self._destination, exist_ok=True)
+                summary = os.path.join(self._destination, os.path.basename(summary))
+
+            if os.path.exists(summary) and not force:
+                log.info("Summary already exists (%s) - run with --force to replace" % summary)
+                continue
+
+            count = glot.summary.summarize_archive(archive, guid, summary, fmt, log)
+            log.info("Summarized %d arrays from %s into %s" % (count, archive, summary))
+
     def inspect(self, archive, destination=None, mode='elmer-libnuma'):
         log = self._log
         verbose = self._verbose
@@ -391,6 +666,34 @@ class GlotActor:
 
         self.setup(path, mode, rootpath)
 
+    def _parse_definition(self, xml_filename):
+        log = self._log
+
+        with open(xml_filename, 'rb') as f:
+            content = f.read()
+
+        if self._definition_cache is None:
+            self._definition_cache = glot.cache.DefinitionCache(version=_comparator_version())
+
+        key = self._definition_cache.key(content)
+        entry = self._definition_cache.get(key)
+
+        if entry is None:
+            tree = lxml.etree.fromstring(content)
+            definition = gssa_xml_to_definition(tree)
+
+            configuration_yamls = [
+                ('parameters.yml', yaml.dump(definition.get_parameters_dict(), default_flow_style=False)),
+                ('needle_parameters.yml', yaml.dump_all(definition.get_needle_dicts(), default_flow_style=False)),
+                ('regions.yml', yaml.dump(definition.get_regions_dict(), default_flow_style=False))
+            ]
+
+            entry = self._definition_cache.set(key, definition.get_family(), configuration_yamls)
+        else:
+            log.debug("Using cached definition for {xml} ({key})".format(xml=xml_filename, key=key))
+
+        return entry['family'], entry['configuration_yamls']
+
     def setup(self, path='.', mode='elmer-libnuma', rootpath=None, definition=()):
         log = self._log
         force = self._force
@@ -415,10 +718,7 @@ class GlotActor:
 
         if gssa_xml_to_definition:
             try:
-                with open(os.path.join(rootpath, 'original.xml'), 'r') as f:
-                    tree = lxml.etree.parse(f)
-                definition = gssa_xml_to_definition(tree.getroot())
-                family = definition.get_family()
+                family, configuration_yamls = self._parse_definition(os.path.join(rootpath, 'original.xml'))
             except Exception as e:
                 traceback.print_exc()
                 log.warn("Could not parse original.xml to find family")
@@ -430,16 +730,11 @@ class GlotActor:
                 else:
                     log.warn("Could not find family (%s) in known utilities" % family)
 
-            configuration_yamls = [
-                ('parameters.yml', definition.get_parameters_dict(), yaml.dump),
-                ('needle_parameters.yml', definition.get_needle_dicts(), yaml.dump_all),
-                ('regions.yml', definition.get_regions_dict(), yaml.dump)
-            ]
-
-            for filename, obj, dump in configuration_yamls:
+            for filename, content in configuration_yamls:
+                filename = os.path.join(rootpath, 'input', filename)
                 if not os.path.exists(filename):
-                    with open(os.path.join(rootpath, 'input', filename), 'w') as pf:
-                        dump(obj, pf, default_flow_style=False)
+                    with open(filename, 'w') as pf:
+                        pf.write(content)
         else:
             log.warn("No gssa_xml_to_definition function (glossia.comparator) so using given 'mode'")
             family = mode
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import shutil
+
+
+def cache_directory(*parts):
+    """Return (creating, if necessary) a subdirectory of the glot cache.
+
+    This follows XDG_CACHE_HOME where set, otherwise ~/.cache/glot.
+    """
+    base = os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+
+    path = os.path.join(base, 'glot', *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# Bump when the content of a cached definition changes
+_definition_format = 1
+
+
+class DefinitionCache:
+    """Results of parsing GSSA-XML, keyed by a hash of the XML content
+    and the version of the parser that produced them.
+
+    Entries are held in memory for the life of the process, so batches
+    parse each distinct definition once, and on disk so that re-running
+    setup on the same bundle need not parse at all.
+    """
+    _memo = {}
+
+    def __init__(self, directory=None, version=None):
+        self._directory = directory
+        self._version = version
+
+    def key(self, content):
+        digest = hashlib.sha256(('%d:%s:' % (_definition_format, self._version)).encode('utf-8'))
+        digest.update(content)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        directory = self._directory if self._directory else cache_directory('definitions')
+        return os.path.join(directory, '%s.json' % key)
+
+    def get(self, key):
+        if key in self._memo:
+            return self._memo[key]
+
+        try:
+            with open(self._path(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        self._memo[key] = entry
+        return entry
+
+    def set(self, key, family, configuration_yamls):
+        entry = {
+            'family': family,
+            'configuration_yamls': [list(c) for c in configuration_yamls]
+        }
+        self._memo[key] = entry
+
+        # Write atomically, so a concurrent setup never sees half an entry
+        path = self._path(key)
+        partial = '%s.%d' % (path, os.getpid())
+        with open(partial, 'w') as f:
+            json.dump(entry, f)
+        os.replace(partial, path)
+
+        return entry
+
+
+class ResultsCache:
+    """Archives received from the server, keyed by GUID and artifact type.
+
+    Entries are only valid for the completion timestamp and size they were
+    stored with, and the least recently used are evicted once the cache
+    grows beyond `max_size` bytes. Archives are copied in and out, never
+    shared with the user's copy, so changes to one cannot reach the other.
+    """
+
+    def __init__(self, max_size, directory=None):
+        self._max_size = max_size
+        self._directory = directory
+
+    def _paths(self, guid, artifact):
+        directory = self._directory if self._directory else cache_directory('results')
+        stem = os.path.join(directory, '%s-%s' % (guid, artifact))
+        return stem + '.tgz', stem + '.json'
+
+    def get(self, guid, artifact, completed):
+        """Return the cached archive and the server's original response,
+        or (None, None) if we have nothing valid."""
+        archive, metadata = self._paths(guid, artifact)
+
+        try:
+            with open(metadata, 'r') as f:
+                entry = json.load(f)
+            size = os.stat(archive).st_size
+        except (OSError, ValueError):
+            return None, None
+
+        if entry['completed'] != completed or entry.get('size') != size:
+            return None, None
+
+        # Modification time marks recency of use, for eviction
+        os.utime(archive)
+
+        return archive, entry['response']
+
+    def put(self, guid, artifact, completed, filename, response):
+        archive, metadata = self._paths(guid, artifact)
+
+        copy_file(filename, archive)
+        os.chmod(archive, 0o444)
+        with open(metadata, 'w') as f:
+            json.dump({
+                'completed': completed,
+                'size': os.stat(archive).st_size,
+                'response': response
+            }, f)
+
+        self.evict()
+
+    def evict(self):
+        directory = self._directory if self._directory else cache_directory('results')
+
+        archives = []
+        for name in os.listdir(directory):
+            if name.endswith('.tgz'):
+                path = os.path.join(directory, name)
+                st = os.stat(path)
+                archives.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in archives)
+        for _, size, path in sorted(archives):
+            if total <= self._max_size:
+                break
+
+            for stale in (path, path[:-len('.tgz')] + '.json'):
+                try:
+                    os.unlink(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+def copy_file(source, destination):
+    """Copy atomically, so no one sees a partial file at `destination`"""
+    partial = '%s.%d' % (destination, os.getpid())
+    shutil.copyfile(source, partial)
+    os.replace(partial, destination)
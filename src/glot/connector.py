@@ -17,56 +17,144 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from autobahn.asyncio.wamp import ApplicationSession
 from autobahn.asyncio.wamp import ApplicationRunner
+from autobahn.wamp.exception import ApplicationError, TransportLost
 import asyncio
 import logging
 import traceback
+import txaio
 from functools import partial
 
 logger = logging.getLogger(__name__)
 
+_default_retries = 5
+_default_timeout = 120.0
+_backoff_initial = 0.5
+_backoff_maximum = 30.0
+_close_timeout = 5.0
 
-def execute(action, actor, server, router, port, debug=False, **kwargs):
-    responses = []
+# Calls that may be repeated safely when we cannot tell whether they completed
+_idempotent_calls = (
+    'api',
+    'search',
+    'retrieve_status',
+    'logs',
+    'update_settings_xml',
+    'request_results',
+    'request_diagnostic'
+)
+
+
+def new_event_loop(use_uvloop=False):
+    if use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("uvloop is not installed - using the default event loop")
+        else:
+            return uvloop.new_event_loop()
+
+    return asyncio.new_event_loop()
+
+
+def run(coroutine, use_uvloop=False):
+    """Run a coroutine to completion on a fresh event loop"""
+    loop = new_event_loop(use_uvloop)
+    asyncio.set_event_loop(loop)
+
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def execute_session(main, actor, server, router, port, debug=False, retries=_default_retries,
+                    timeout=_default_timeout, use_uvloop=False):
+    """Run the coroutine function `main` with a single connection, shared
+    by every call made during it, returning that connection."""
     if debug:
         logger.info("DEBUG ON")
         logging.getLogger('autobahn').setLevel(logging.DEBUG)
 
     runner = ApplicationRunner(url="ws://%s:%d/ws" % (router, port), realm="realm1")
+    connection = GlotConnection(runner, server=server, debug=debug, retries=retries, timeout=timeout)
+
+    actor.set_make_call(connection.execute_call)
+
+    # Our WAMP sessions come and go with the connection, so the actor logs
+    # for itself rather than through one of them
+    if not actor.has_log():
+        actor.set_log(txaio.make_logger())
+
+    async def session():
+        try:
+            await main(connection)
+        finally:
+            await connection.close()
+
     logger.debug("Starting connection")
-    runner.run(partial(GlotConnector, responses=responses, action=action, actor=actor, debug=debug, server=server, **kwargs))
-    return responses.pop() if responses else None
+    run(session(), use_uvloop)
 
+    return connection
 
-# This should be adjusted when this issue resolution hits PIP: https://github.com/tavendo/AutobahnPython/issues/332
-# http://stackoverflow.com/questions/28293198/calling-a-remote-procedure-from-a-subscriber-and-resolving-the-asyncio-promise
-def wrapped_coroutine(f):
-    def wrapper(*args, **kwargs):
-        coro = f(*args, **kwargs)
-        asyncio.async(coro)
-    return wrapper
-# endSO
 
+def execute(action, actor, server, router, port, debug=False, retries=_default_retries,
+            timeout=_default_timeout, use_uvloop=False, **kwargs):
+    async def main(connection):
+        await connection.run(action, actor, **kwargs)
 
-# This is the application object for the shell GSSA client
-class GlotConnector(ApplicationSession):
+    connection = execute_session(main, actor, server, router, port, debug, retries, timeout, use_uvloop)
 
-    # Accept arguments from the command line
-    def __init__(self, x, responses, action, actor, debug, server=None, **kwargs):
-        ApplicationSession.__init__(self, x)
-        self._kwargs = kwargs
-        self._action = action
-        self._server = server
-        self._responses = responses
+    return connection.response
 
-        self._actor = actor
-        self._actor.set_make_call(self.execute_call)
-        self._actor.set_log(self.log)
 
-        self._apis = {}
+# This is the WAMP session for the shell GSSA client - it lasts only as long as
+# the underlying connection, so anything longer-lived belongs on GlotConnection
+class GlotConnector(ApplicationSession):
+
+    def __init__(self, x, connection, debug):
+        ApplicationSession.__init__(self, x)
+        self._connection = connection
 
         if debug:
             # Seemingly the start_logging call is insufficient
             self.log._set_level('trace')
+
+    def onJoin(self, details):
+        logger.debug("Session ready")
+        self._connection.joined(self)
+
+    def onDisconnect(self):
+        self._connection.disconnected(self)
+
+
+class GlotConnection:
+    """Keep a session to the router for the duration of an action.
+
+    Dropped connections are re-established with exponential backoff and
+    calls that did not complete are retried, where that is safe.
+    """
+
+    def __init__(self, runner, server=None, debug=False, retries=_default_retries, timeout=_default_timeout):
+        self._runner = runner
+        self._server = server
+        self._debug = debug
+        self._retries = retries
+        self._timeout = timeout
+
+        self._session = None
+        self._joined = None
+        self._closing = False
+        # Created once we are running, as before Python 3.10 a lock binds to
+        # the loop current at construction
+        self._lock = None
+        self._apis = {}
+
+        # Only the most recent is kept, as a long-lived connection (e.g. a
+        # watching queue runner) may make any number of calls
+        self.response = None
+
         if server or debug:
             logger.info("Targeting server [%s]" % (server))
 
@@ -78,32 +166,77 @@ class GlotConnector(ApplicationSession):
         else:
             return "com.gosmartsimulation.%s" % suffix
 
-    @wrapped_coroutine
-    @asyncio.coroutine
-    def onJoin(self, details):
+    def joined(self, session):
+        self._session = session
+        if self._joined is not None and not self._joined.done():
+            self._joined.set_result(session)
+
+    def disconnected(self, session):
+        if session is self._session:
+            self._session = None
+            if not self._closing:
+                logger.warning("Lost connection to router")
+
+    async def session(self):
+        """Return a joined session, (re)connecting if necessary"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            delay = _backoff_initial
+            attempt = 0
+            while self._session is None:
+                self._joined = asyncio.get_running_loop().create_future()
+                try:
+                    await self._runner.run(
+                        partial(GlotConnector, connection=self, debug=self._debug),
+                        start_loop=False
+                    )
+                    await asyncio.wait_for(self._joined, self._timeout)
+                except (OSError, asyncio.TimeoutError) as e:
+                    attempt += 1
+                    if attempt > self._retries:
+                        raise
+                    logger.warning("Could not connect to router (%s) - retrying in %.1lfs" % (e, delay))
+                    await asyncio.sleep(delay)
+                    delay = min(2 * delay, _backoff_maximum)
+
+            return self._session
+
+    async def run(self, action, actor, **kwargs):
+        await self.session()
         logger.debug("Session ready - executing action")
 
         try:
-            self.result = yield from self._action(self._actor, **self._kwargs)
+            result = await action(actor, **kwargs)
         except Exception as e:
             logging.exception("Problem executing action")
             traceback.print_exc()
             raise e
-        finally:
-            self.leave()
 
         logger.debug("Executed")
+        return result
+
+    async def close(self):
+        self._closing = True
+        if self._session is not None:
+            # Leaving gives us the transport's closing future, if any
+            closed = self._session.leave()
+            if closed is not None:
+                try:
+                    await asyncio.wait_for(closed, _close_timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("Router did not close the connection")
 
-    @asyncio.coroutine
-    def execute_call(self, suffix, *args, minapi='A0.0'):
+    async def execute_call(self, suffix, *args, minapi='A0.0'):
         if minapi:
             if suffix in self._apis:
                 api = self._apis[suffix]
             else:
                 try:
-                    api = yield from self.call(self.make_call('api'))
-                    api = str(api)
-                except:
+                    api = await self._call('api')
+                    api = str(api) if api else 'A0.0'
+                except Exception:
                     api = 'A0.0'
                 self._apis[suffix] = api
 
@@ -117,13 +250,78 @@ class GlotConnector(ApplicationSession):
             if api < minapi:
                 raise NotImplementedError('The API version of the remote server is too low for this operation (%.1lf < %.1lf)' % (api, minapi))
 
-        try:
-            result = yield from self.call(self.make_call(suffix), *args)
-            self._responses.append(result)
-        except:
-            logger.exception("Could not complete call")
+        result = await self._call(suffix, *args)
+        self.response = result
 
         return result
 
-    def onDisconnect(self):
-        asyncio.get_event_loop().stop()
+    def _transient(self, suffix, e):
+        if isinstance(e, (TransportLost, asyncio.TimeoutError, OSError)):
+            return True
+
+        # A Glossia server reconnecting to the router will briefly have no
+        # procedures registered, unless it is too old to provide them at all
+        if isinstance(e, ApplicationError):
+            if e.error == ApplicationError.NO_SUCH_PROCEDURE:
+                return suffix != 'api'
+            return e.error == ApplicationError.CANCELED
+
+        return False
+
+    async def _call(self, suffix, *args):
+        delay = _backoff_initial
+        attempt = 0
+
+        while True:
+            session = await self.session()
+            try:
+                return (await asyncio.wait_for(session.call(self.make_call(suffix), *args), self._timeout))
+            except Exception as e:
+                # The server refused, so the caller must know - carrying on
+                # would, e.g., start a simulation that was never initiated
+                if not self._transient(suffix, e):
+                    logger.error("Call to %s failed: %s" % (suffix, e))
+                    raise
+
+                attempt += 1
+                if attempt > self._retries:
+                    logger.error("Giving up on %s after %d attempts" % (suffix, attempt))
+                    raise
+
+                if suffix not in _idempotent_calls:
+                    completed = await self._completed(suffix, *args)
+                    if completed is None:
+                        logger.error("Could not determine whether %s completed - not retrying" % suffix)
+                        raise
+                    elif completed:
+                        logger.info("Call to %s had completed before the failure" % suffix)
+                        return True
+
+                logger.warning("Call to %s failed (%s) - retrying in %.1lfs" % (suffix, type(e).__name__, delay))
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, _backoff_maximum)
+
+    async def _completed(self, suffix, guid=None, *args):
+        """Check whether a non-idempotent call took effect on the server.
+
+        As GUIDs are generated by the client, we can ask the server about
+        the simulation directly. Returns None where we cannot tell.
+        """
+        if guid is None or suffix not in ('init', 'finalize', 'start'):
+            return None
+
+        try:
+            simulation = await self._call('retrieve_status', guid)
+        except ApplicationError:
+            return None
+        if simulation is not None and not isinstance(simulation, dict):
+            return None
+
+        if suffix == 'init':
+            return bool(simulation)
+        elif not simulation:
+            return False
+        elif suffix == 'finalize':
+            return bool(simulation.get('finalized'))
+        else:
+            return bool(simulation.get('status') or simulation.get('exit_status'))
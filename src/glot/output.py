@@ -0,0 +1,57 @@
+import csv
+import json
+import sys
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# Formats other than 'table' emit raw records for consumption by other tools
+formats = ('table', 'json', 'jsonl', 'csv', 'arrow')
+
+
+def write_records(records, fields, fmt, stream=None):
+    """Write an iterable of dicts in a machine-readable format.
+
+    Records are written as they are produced, where the format allows it,
+    so that large result sets need not be held in memory in rendered form.
+    """
+    if stream is None:
+        stream = sys.stdout
+
+    if fmt == 'jsonl':
+        for record in records:
+            stream.write(json.dumps(record))
+            stream.write('\n')
+    elif fmt == 'json':
+        stream.write('[')
+        for i, record in enumerate(records):
+            if i:
+                stream.write(',\n ')
+            stream.write(json.dumps(record))
+        stream.write(']\n')
+    elif fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+    elif fmt == 'arrow':
+        if pyarrow is None:
+            raise RuntimeError("The arrow output format requires pyarrow to be installed")
+
+        columns = {field: [] for field in fields}
+        for record in records:
+            for field in fields:
+                columns[field].append(record.get(field))
+
+        table = pyarrow.table(columns)
+        stream.flush()
+        sink = getattr(stream, 'buffer', stream)
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError("Unknown output format: %s" % fmt)
+
+    stream.flush()
@@ -0,0 +1,101 @@
+import collections
+import heapq
+
+_record_fields = ('guid', 'finalized', 'timestamp', 'percentage', 'message', 'success')
+
+
+class SimulationRecord(collections.namedtuple('SimulationRecord', _record_fields)):
+    """Status of a simulation, as decoded from a server search result.
+
+    `percentage` is None unless the server gave a number, and `success`
+    is None until the simulation has exited.
+    """
+    __slots__ = ()
+
+    fields = _record_fields
+
+    @property
+    def exited(self):
+        return self.success is not None
+
+    @property
+    def running(self):
+        return self.finalized and self.success is None
+
+    @property
+    def sort_timestamp(self):
+        # Most recent first, with any that have never reported last
+        return -self.timestamp if self.timestamp else 0
+
+
+def decode(guid, definition):
+    """Normalise a single definition from the server into a record"""
+    if not definition:
+        raise Exception("Empty definition!")
+
+    status = definition['status']
+    if status:
+        timestamp = status['timestamp']
+        message = status['message']
+        try:
+            percentage = float(status['percentage'])
+        except (TypeError, ValueError):
+            percentage = None
+    else:
+        timestamp, percentage, message = None, None, None
+
+    exit_status = definition['exit_status']
+
+    return SimulationRecord(
+        guid,
+        bool(definition['finalized']),
+        timestamp if timestamp else None,
+        percentage,
+        message,
+        None if not exit_status else exit_status[0] in (True, 'SUCCESS')
+    )
+
+
+def decode_definitions(definitions, log=None):
+    """Decode a search result, skipping (and logging) malformed entries"""
+    records = []
+
+    if not definitions:
+        return records
+
+    for guid, definition in definitions.items():
+        if not definition:
+            raise Exception("Empty definition!")
+
+        try:
+            records.append(decode(guid, definition))
+        except (KeyError, IndexError, TypeError) as e:
+            if log is None:
+                raise
+
+            log.error('Could not decode status for a simulation')
+            log.error(str(e))
+            log.error(guid)
+            # Work around txaio's {} parsing
+            log.error(str(definition).replace('{', '[').replace('}', ']'))
+
+    return records
+
+
+_sort_keys = {
+    'timestamp': lambda r: r.sort_timestamp,
+    'guid': lambda r: r.guid
+}
+
+
+def select(records, sort=None, limit=None):
+    """Sort records by `sort` ('timestamp' or 'guid') and truncate to `limit`"""
+    key = _sort_keys.get(sort)
+
+    # For a short page of a long result, a heap avoids a full sort
+    if key is not None and limit:
+        return heapq.nsmallest(limit, records, key=key)
+    elif key is not None:
+        return sorted(records, key=key)
+
+    return records[:limit] if limit else records
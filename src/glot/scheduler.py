@@ -0,0 +1,114 @@
+import contextlib
+import fcntl
+import json
+import os
+import time
+
+# Times we try to launch a queued entry before dropping it
+_default_attempts = 3
+
+
+def data_directory(*parts):
+    """Return (creating, if necessary) a subdirectory of glot's local data.
+
+    This follows XDG_DATA_HOME where set, otherwise ~/.local/share/glot.
+    """
+    base = os.environ.get('XDG_DATA_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.local', 'share')
+
+    path = os.path.join(base, 'glot', *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class LaunchQueue:
+    """Launches awaiting admission to the server, persisted as JSON.
+
+    Every change is made under a lock, so launches may be queued while
+    another glot process is running the queue.
+    """
+
+    def __init__(self, path=None):
+        self._path = path if path else os.path.join(data_directory(), 'queue.json')
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(self._path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self._path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'next': 1, 'entries': []}
+
+    def _save(self, queue):
+        partial = '%s.%d' % (self._path, os.getpid())
+        with open(partial, 'w') as f:
+            json.dump(queue, f, indent=1)
+        os.replace(partial, self._path)
+
+    def add(self, priority, gssa_xml, tmp_subdirectory, tmp_directory, input_files, definition_files):
+        # Better to refuse now than to fail when the queue is run
+        for filename in [gssa_xml] + list(input_files) + list(definition_files):
+            if not os.path.isfile(filename):
+                raise RuntimeError("No such file: %s" % filename)
+
+        # The queue may be run from elsewhere, so we hold on to absolute paths
+        entry = {
+            'priority': priority,
+            'queued': time.time(),
+            'gssa_xml': os.path.abspath(gssa_xml),
+            'tmp_subdirectory': tmp_subdirectory,
+            'tmp_directory': os.path.abspath(tmp_directory) if tmp_directory else None,
+            'input_files': [os.path.abspath(f) for f in input_files],
+            'definition_files': [os.path.abspath(f) for f in definition_files],
+            'attempts': 0
+        }
+
+        with self._locked():
+            queue = self._load()
+            entry['id'] = queue['next']
+            queue['next'] += 1
+            queue['entries'].append(entry)
+            self._save(queue)
+
+        return entry['id']
+
+    def entries(self):
+        """Queued launches, in the order they will be admitted"""
+        with self._locked():
+            entries = self._load()['entries']
+
+        return sorted(entries, key=lambda e: (-e['priority'], e['id']))
+
+    def remove(self, entry_id):
+        with self._locked():
+            queue = self._load()
+            queue['entries'] = [e for e in queue['entries'] if e['id'] != entry_id]
+            self._save(queue)
+
+    def fail(self, entry_id, error, max_attempts):
+        """Record a failed launch, dropping the entry once it has failed
+        `max_attempts` times. Returns True if it was dropped."""
+        with self._locked():
+            queue = self._load()
+
+            dropped = False
+            for entry in queue['entries']:
+                if entry['id'] == entry_id:
+                    entry['attempts'] = entry.get('attempts', 0) + 1
+                    entry['error'] = error
+                    dropped = entry['attempts'] >= max_attempts
+
+            if dropped:
+                queue['entries'] = [e for e in queue['entries'] if e['id'] != entry_id]
+            self._save(queue)
+
+        return dropped
@@ -0,0 +1,326 @@
+import asyncio
+import base64
+import csv
+import functools
+import io
+import os
+import queue
+import tarfile
+import threading
+import zlib
+
+import lxml.etree
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+formats = ('npz', 'parquet')
+
+# Chunks of a streamed archive waiting to be summarized, at most, and how
+# often a blocked producer checks that the summary is still running
+_queued_chunks = 64
+_put_interval = 0.1
+
+# Columns of a summary - one row for each component of each array found
+_summary_fields = ('source', 'array', 'component', 'count', 'min', 'max', 'mean', 'last')
+
+_vtk_types = {
+    'Int8': 'i1', 'UInt8': 'u1',
+    'Int16': 'i2', 'UInt16': 'u2',
+    'Int32': 'i4', 'UInt32': 'u4',
+    'Int64': 'i8', 'UInt64': 'u8',
+    'Float32': 'f4', 'Float64': 'f8'
+}
+
+
+def archive_guid(archive):
+    """The GUID an archive is named for, e.g. GUID-results.tgz gives GUID"""
+    stem = os.path.basename(archive).split('.')[0]
+    for suffix in ('-results', '-diagnostic'):
+        if stem.endswith(suffix):
+            return stem[:-len(suffix)]
+    return stem
+
+
+def summary_filename(archive, fmt='npz'):
+    """Name a summary after its archive, e.g. GUID-results.tgz becomes
+    GUID-summary.npz"""
+    return os.path.join(os.path.dirname(archive), '%s-summary.%s' % (archive_guid(archive), fmt))
+
+
+def _statistics(values):
+    finite = values[numpy.isfinite(values)]
+    if not len(finite):
+        return 0, numpy.nan, numpy.nan, numpy.nan, numpy.nan
+
+    return len(finite), finite.min(), finite.max(), finite.mean(), finite[-1]
+
+
+def _summarize_csv(source, f):
+    # Members of a streamed archive cannot be wrapped as text, so we decode
+    # line by line
+    rows = csv.reader(line.decode('utf-8', errors='replace') for line in f)
+
+    header = next(rows, None)
+    if header is None:
+        return
+
+    # Not all output has a header row
+    try:
+        [float(h) for h in header]
+    except ValueError:
+        names, data = header, []
+    else:
+        names, data = ['column%d' % i for i in range(len(header))], [header]
+
+    columns = [[] for _ in names]
+    for row in data + [r for r in rows]:
+        for column, value in zip(columns, row):
+            try:
+                column.append(float(value))
+            except ValueError:
+                column.append(None)
+
+    for name, column in zip(names, columns):
+        # Skip anything that was not numeric throughout
+        if not column or any(v is None for v in column):
+            continue
+        yield (source, name.strip(), 0) + _statistics(numpy.array(column))
+
+
+def _decode_vtk_binary(text, dtype, header_type, compressed):
+    header_dtype = numpy.dtype(header_type)
+    size = header_dtype.itemsize
+    text = text.strip().encode('ascii')
+
+    if not compressed:
+        raw = base64.b64decode(text)
+        length = int(numpy.frombuffer(raw[:size], header_dtype)[0])
+        return numpy.frombuffer(raw[size:size + length], dtype)
+
+    # Compressed arrays have a separately encoded header giving block sizes
+    chars = 4 * ((3 * size + 2) // 3)
+    blocks = int(numpy.frombuffer(base64.b64decode(text[:chars]), header_dtype)[0])
+    chars = 4 * (((3 + blocks) * size + 2) // 3)
+    header = numpy.frombuffer(base64.b64decode(text[:chars]), header_dtype)
+
+    raw = base64.b64decode(text[chars:])
+    data, offset = [], 0
+    for block_size in header[3:]:
+        data.append(zlib.decompress(raw[offset:offset + int(block_size)]))
+        offset += int(block_size)
+
+    return numpy.frombuffer(b''.join(data), dtype)
+
+
+def _summarize_vtu(source, f, log=None):
+    byte_order = '<'
+    header_type = 'u4'
+    compressed = False
+
+    for event, element in lxml.etree.iterparse(f, events=('start', 'end'), huge_tree=True):
+        if event == 'start':
+            if element.tag == 'VTKFile':
+                byte_order = '>' if element.get('byte_order') == 'BigEndian' else '<'
+                header_type = byte_order + _vtk_types[element.get('header_type', 'UInt32')]
+                compressed = element.get('compressor') is not None
+            continue
+
+        if element.tag == 'DataArray' and element.getparent().tag == 'PointData':
+            name = element.get('Name')
+            dtype = numpy.dtype(byte_order + _vtk_types[element.get('type')])
+            components = int(element.get('NumberOfComponents', 1))
+            form = element.get('format')
+
+            if form == 'ascii':
+                values = numpy.array(element.text.split(), dtype=dtype)
+            elif form == 'binary':
+                values = _decode_vtk_binary(element.text, dtype, header_type, compressed)
+            else:
+                if log:
+                    log.warn("Skipping %s in %s - appended data is not supported" % (name, source))
+                values = None
+
+            if values is not None:
+                values = values.astype('f8').reshape(-1, components)
+                for component in range(components):
+                    yield (source, name, component) + _statistics(values[:, component])
+
+        # Elements we have finished with need not stay in memory
+        if element.tag in ('DataArray', 'Piece'):
+            element.clear()
+
+
+def summarize(fileobj, log=None):
+    """Summarize recognised output files in a tar stream, in one pass.
+
+    The archive is read sequentially and nothing is extracted to disk, so
+    this may run on an archive as it arrives.
+    """
+    rows = []
+
+    with tarfile.open(fileobj=fileobj, mode='r|*') as t:
+        for member in t:
+            if not member.isfile():
+                continue
+
+            extension = os.path.splitext(member.name)[1].lower()
+            if extension == '.csv':
+                summarize_member = _summarize_csv
+            elif extension == '.vtu':
+                summarize_member = functools.partial(_summarize_vtu, log=log)
+            else:
+                continue
+
+            f = t.extractfile(member)
+            try:
+                rows.extend(summarize_member(member.name, f))
+            except Exception as e:
+                if log:
+                    log.warn("Could not summarize %s: %s" % (member.name, e))
+
+    return rows
+
+
+def write_summary(rows, guid, output, fmt='npz'):
+    columns = dict(zip(_summary_fields, zip(*rows))) if rows else {field: () for field in _summary_fields}
+
+    if fmt == 'npz':
+        numpy.savez_compressed(
+            output,
+            guid=numpy.array(guid),
+            source=numpy.array(columns['source'], dtype=str),
+            array=numpy.array(columns['array'], dtype=str),
+            component=numpy.array(columns['component'], dtype='i4'),
+            count=numpy.array(columns['count'], dtype='i8'),
+            **{stat: numpy.array(columns[stat], dtype='f8') for stat in ('min', 'max', 'mean', 'last')}
+        )
+    elif fmt == 'parquet':
+        if pyarrow is None:
+            raise RuntimeError("The parquet summary format requires pyarrow to be installed")
+
+        table = pyarrow.table(dict(
+            guid=[guid] * len(rows),
+            **{field: list(columns[field]) for field in _summary_fields}
+        ))
+        pyarrow.parquet.write_table(table, output)
+    else:
+        raise ValueError("Unknown summary format: %s" % fmt)
+
+
+def summarize_archive(archive, guid, output, fmt='npz', log=None):
+    if numpy is None:
+        raise RuntimeError("Summaries require numpy to be installed")
+
+    with open(archive, 'rb') as f:
+        rows = summarize(f, log)
+
+    write_summary(rows, guid, output, fmt)
+    return len(rows)
+
+
+class _QueueReader(io.RawIOBase):
+    """Blocking file-like view of chunks arriving on a queue"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b''
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            self._buffer = self._chunks.get()
+            self._eof = not self._buffer
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class StreamingSummary:
+    """Summarize an archive from its chunks as they are received.
+
+    A thread is started with the first chunk, so if an archive arrives
+    some other way (e.g. from the cache), nothing has been done and the
+    caller should summarize the file instead. Only a few chunks are held
+    at once, so a slow summary holds up the upload rather than buffering
+    the archive in memory.
+    """
+
+    def __init__(self, guid, output, fmt='npz', log=None):
+        if numpy is None:
+            raise RuntimeError("Summaries require numpy to be installed")
+
+        self._guid = guid
+        self._output = output
+        self._fmt = fmt
+        self._log = log
+
+        self._chunks = queue.Queue(maxsize=_queued_chunks)
+        self._thread = None
+        self._closed = False
+        self._error = None
+        self.rows = None
+
+    @property
+    def started(self):
+        return self._thread is not None
+
+    def _run(self):
+        try:
+            self.rows = summarize(io.BufferedReader(_QueueReader(self._chunks)), self._log)
+            write_summary(self.rows, self._guid, self._output, self._fmt)
+        except Exception as e:
+            self._error = e
+
+    def _put(self, chunk):
+        # Once the thread has finished (e.g. at the end of the tar, or on
+        # failure) nothing will take the rest, so we need not hold on to it
+        while self._thread.is_alive():
+            try:
+                self._chunks.put(chunk, timeout=_put_interval)
+            except queue.Full:
+                continue
+            return
+
+    async def feed(self, chunk):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        chunk = bytes(chunk)
+        try:
+            self._chunks.put_nowait(chunk)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, self._put, chunk)
+
+    async def close(self):
+        """End the stream and wait for the thread. This must be called,
+        however the transfer ends, once anything has been fed."""
+        if self._thread is None or self._closed:
+            return
+
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._put, b'')
+        await loop.run_in_executor(None, self._thread.join)
+
+    async def finish(self):
+        await self.close()
+
+        if self._error is not None:
+            raise self._error
+
+        return len(self.rows)
@@ -1,61 +1,448 @@
 from aiohttp import web
 import asyncio
+import collections
+import datetime
+import fcntl
+import ipaddress
+import os
+import socket
+import struct
+import sys
+import time
+import uuid
 
 _default_server_port = 18103
+_default_port_span = 100
 
+# Used to find an address a Glossia container can reach us at, when our
+# route to the router is loopback. The probe address is TEST-NET-1 - only
+# a route is looked up, nothing is sent.
+_docker_bridge = 'docker0'
+_external_probe = '192.0.2.1'
+_SIOCGIFADDR = 0x8915
 
-class OneFileHttpServer:
-    def __init__(self, log, app, srv, handler, fut):
-        self._app = app
-        self._srv = srv
-        self._handler = handler
-        self._log = log
-        self._fut = fut
+# Remote servers advertising at least this API accept file:// targets
+_shared_path_minapi = 'A1.1'
+
+# How long to wait for a file in the shared directory to appear, and then
+# to stop growing, before we treat it as complete
+_shared_appear_timeout = 30.0
+_shared_settle_time = 1.0
+_shared_poll_interval = 0.25
+
+
+class SharedDirectory:
+    """A directory visible to both glot and Glossia.
+
+    As with the transferrer directory, the two may see it at different
+    paths (e.g. when Glossia runs in a container), so we keep both.
+    """
+
+    def __init__(self, local, remote=None):
+        self.local = os.path.abspath(local)
+        self.remote = remote if remote else self.local
 
     @classmethod
-    @asyncio.coroutine
-    def make(cls, log, filename):
-        fut = asyncio.Future()
+    def parse(cls, spec):
+        """Build from a LOCAL[:REMOTE] specification"""
+        local, _, remote = spec.partition(':')
+        return cls(local, remote)
 
-        def receive(request):
-            log.debug('Got request')
-            yield from request.post()
+    def local_path(self, filename):
+        return os.path.join(self.local, os.path.basename(filename))
+
+    def remote_path(self, filename):
+        return os.path.join(self.remote, os.path.basename(filename))
+
+    def target(self, filename):
+        return 'file://%s' % self.remote_path(filename)
+
+    def discard(self, filename):
+        """Remove anything left from an earlier transfer of `filename`, so it
+        cannot be mistaken for the archive we are about to request"""
+        path = self.local_path(filename)
+        for stale in (path, path + '.part'):
             try:
-                with open(filename, 'wb') as f:
-                    g = request.POST['file'].file
-                    f.write(g.read())
-                fut.set_result(filename)
-            except:
-                log.exception('Could not receive file')
-                fut.set_result(None)
+                os.unlink(stale)
+            except FileNotFoundError:
+                pass
 
-            return web.Response(body=b"Accepted")
+    def _size(self, path):
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return None
 
-        app = web.Application()
-        log.debug('Adding POST route at /receive')
-        app.router.add_route('POST', '/receive', receive)
+    async def claim(self, filename, appear_timeout=_shared_appear_timeout, stall_timeout=None):
+        """Wait for the server to write `filename` and move it into place.
+
+        The server may still be writing when its call returns, so the file
+        is only taken once any `.part` file has been renamed and its size has
+        stopped changing. Returns None if nothing appears within
+        `appear_timeout` seconds.
+
+        Where the shared directory is on another filesystem, we leave the file
+        in place rather than copy it, and return its location there.
+        """
+        path = self.local_path(filename)
+
+        last_size = None
+        started = last_activity = time.monotonic()
+        while True:
+            now = time.monotonic()
+            size = self._size(path)
+            writing = self._size(path + '.part')
+
+            if size is None and writing is None:
+                if now - started > appear_timeout:
+                    return None
+            else:
+                current = (size, writing)
+                if current != last_size:
+                    last_size, last_activity = current, now
+                elif writing is None and now - last_activity >= _shared_settle_time:
+                    break
+                elif stall_timeout and now - last_activity > stall_timeout:
+                    raise RuntimeError("Transfer stalled - nothing received for %gs" % stall_timeout)
+
+            await asyncio.sleep(_shared_poll_interval)
+
+        try:
+            os.replace(path, filename)
+        except OSError:
+            return path
+
+        return filename
+
+
+def _format_bytes(n):
+    if n < 1024:
+        return "%d B" % n
+
+    for unit in ('KiB', 'MiB', 'GiB'):
+        n /= 1024.
+        if n < 1024 or unit == 'GiB':
+            return "%.1f %s" % (n, unit)
+
+
+class TransferProgress:
+    """Count bytes through a transfer, reporting throughput and ETA.
+
+    The bar is only drawn when the stream is a terminal, but the counters
+    (and so stall detection) are always maintained.
+    """
+
+    _interval = 0.2
+
+    def __init__(self, label, total=None, stream=None):
+        self.label = label
+        self.total = total
+        self.count = 0
+        self.started = time.monotonic()
+        self.last_activity = self.started
+
+        self._stream = stream if stream else sys.stderr
+        self._drawn = 0
+        self._tty = hasattr(self._stream, 'isatty') and self._stream.isatty()
+
+    def update(self, n):
+        self.count += n
+        self.last_activity = time.monotonic()
+
+        if self._tty and self.last_activity - self._drawn > self._interval:
+            self._draw()
+
+    def finish(self):
+        if self._tty:
+            self._draw()
+            self._stream.write('\n')
+            self._stream.flush()
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        return self.count / elapsed if elapsed > 0 else 0.
+
+    def _draw(self):
+        self._drawn = time.monotonic()
+        rate = self.throughput()
+
+        if self.total:
+            line = "%s: %s / %s (%d%%) %s/s" % (
+                self.label,
+                _format_bytes(self.count),
+                _format_bytes(self.total),
+                100 * self.count // self.total,
+                _format_bytes(rate)
+            )
+            if rate > 0 and self.count < self.total:
+                eta = datetime.timedelta(seconds=int((self.total - self.count) / rate))
+                line += " ETA %s" % eta
+        else:
+            line = "%s: %s %s/s" % (self.label, _format_bytes(self.count), _format_bytes(rate))
+
+        self._stream.write('\r\033[K' + line)
+        self._stream.flush()
+
+
+class CountingReader:
+    """File wrapper that reports bytes read to a TransferProgress"""
+
+    def __init__(self, f, progress):
+        self._f = f
+        self._progress = progress
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._progress.update(len(data))
+        return data
+
+
+def parse_ports(spec):
+    """Turn a port specification - PORT or LOW-HIGH - into a range of ports
+    to try. Port 0 asks the OS for an ephemeral port."""
+    if spec is None:
+        return range(_default_server_port, _default_server_port + _default_port_span)
+
+    low, _, high = str(spec).partition('-')
+    low = int(low)
+    high = int(high) if high else low
+    return range(low, high + 1)
+
+
+def _route_address(route_to):
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # No packets are sent, this only selects a route
+        probe.connect((route_to, 1))
+        return probe.getsockname()[0]
+    except OSError:
+        return None
+    finally:
+        probe.close()
+
+
+def _interface_address(name):
+    """IPv4 address of a network interface, or None (Linux only)"""
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        request = struct.pack('256s', name[:15].encode('ascii'))
+        return socket.inet_ntoa(fcntl.ioctl(probe.fileno(), _SIOCGIFADDR, request)[20:24])
+    except OSError:
+        return None
+    finally:
+        probe.close()
+
+
+def is_loopback(address):
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return address == 'localhost'
 
-        loop = asyncio.get_event_loop()
-        handler = app.make_handler()
 
-        # FIXME: this should be tied to the Docker interface,
-        # when we have a good way of calculating it
-        srv = yield from loop.create_server(handler, '0.0.0.0', _default_server_port)
+def local_address(route_to):
+    """Find our address on the route towards `route_to`, which is where a
+    server reaching us through the same network will see us.
 
-        return cls(log, app, srv, handler, fut)
+    Where that is loopback (e.g. the router is on this host), a Glossia
+    container would reach itself instead, so we prefer the Docker bridge,
+    which is its gateway, then our address on the default route.
+    """
+    address = _route_address(route_to)
+    if address is not None and not is_loopback(address):
+        return address
+
+    for candidate in (_interface_address(_docker_bridge), _route_address(_external_probe)):
+        if candidate is not None and not is_loopback(candidate):
+            return candidate
+
+    return address if address else socket.gethostname()
+
+
+class ExpectedUpload:
+    """An archive we have asked the server to push to us"""
+
+    def __init__(self, server, token, filename):
+        self._server = server
+        self.token = token
+        self.filename = filename
+        self.future = asyncio.get_running_loop().create_future()
+
+        # Until the upload begins, we measure inactivity from now
+        self.last_activity = time.monotonic()
+        self.progress = None
+
+        # Coroutine functions also handed each chunk as it arrives, which
+        # may hold up the upload until they are ready for more
+        self.consumers = []
+
+    @property
+    def target(self):
+        """Location to give the server in request_results/request_diagnostic"""
+        return self._server.target(self)
 
     def cancel(self):
-        self._fut.cancel()
-
-    @asyncio.coroutine
-    def wait(self):
-        yield from self._fut
-        return self._fut.result()
-
-    @asyncio.coroutine
-    def close(self):
-        self._srv.close()
-        yield from self._srv.wait_closed()
-        yield from self._app.shutdown()
-        yield from self._handler.finish_connections(60.0)
-        yield from self._app.cleanup()
+        self.future.cancel()
+        self._server.forget(self)
+
+    def _last_activity(self):
+        return self.progress.last_activity if self.progress else self.last_activity
+
+    async def wait(self, stall_timeout=None):
+        """Wait for the file to arrive, giving up if, for `stall_timeout`
+        seconds, neither a connection nor any data has been received."""
+        while not self.future.done():
+            if stall_timeout is None:
+                timeout = None
+            else:
+                timeout = self._last_activity() + stall_timeout - time.monotonic()
+                if timeout <= 0:
+                    self.cancel()
+                    raise RuntimeError("Transfer stalled - nothing received for %gs" % stall_timeout)
+
+            await asyncio.wait([self.future], timeout=timeout)
+
+        self._server.forget(self)
+        return self.future.result()
+
+
+class TransferServer:
+    """HTTP endpoint to which Glossia pushes archives.
+
+    Each expected upload has its own URL, so one server (and port) can
+    receive any number at once. Where we cannot have the legacy port, we
+    take the next free one from the configured range and advertise it.
+    """
+
+    _chunk_size = 2 ** 16
+
+    def __init__(self, log, runner, port, advertise):
+        self._runner = runner
+        self._log = log
+        self._port = port
+        self._advertise = advertise
+        self._expected = collections.OrderedDict()
+
+    @classmethod
+    async def make(cls, log, host=None, ports=None, route_to='localhost'):
+        app = web.Application()
+        server = cls(log, None, None, None)
+
+        log.debug('Adding POST routes at /receive')
+        app.router.add_route('POST', '/receive', server._receive)
+        app.router.add_route('POST', '/receive/{token}', server._receive)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+
+        for port in parse_ports(ports):
+            site = web.TCPSite(runner, '0.0.0.0', port)
+            try:
+                await site.start()
+            except OSError as e:
+                log.debug('Could not bind port %d: %s' % (port, e))
+            else:
+                break
+        else:
+            await runner.cleanup()
+            raise RuntimeError("No free port for transfers in %s" % ports)
+
+        server._runner = runner
+        server._port = runner.addresses[0][1]
+
+        # A Glossia server given no target looks for us at its gateway, on
+        # the legacy port, so we only advertise ourselves when we must
+        if host is None and server._port != _default_server_port:
+            host = local_address(route_to)
+            if is_loopback(host):
+                log.warn(
+                    "Advertising loopback address %s for transfers, which a Glossia container "
+                    "cannot reach - give --transfer-host if transfers stall" % host
+                )
+        server._advertise = host
+
+        log.debug('Receiving transfers on port %d' % server._port)
+
+        return server
+
+    @property
+    def port(self):
+        return self._port
+
+    def expect(self, filename):
+        upload = ExpectedUpload(self, uuid.uuid4().hex, filename)
+        self._expected[upload.token] = upload
+        return upload
+
+    def forget(self, upload):
+        self._expected.pop(upload.token, None)
+
+    def idle(self):
+        return not self._expected
+
+    def target(self, upload):
+        if self._advertise is None:
+            return None
+
+        return 'http://%s:%d/receive/%s' % (self._advertise, self._port, upload.token)
+
+    async def _receive(self, request):
+        log = self._log
+        log.debug('Got request')
+
+        token = request.match_info.get('token')
+        if token is None:
+            # Legacy uploads carry no token, so go to the longest waiting
+            upload = next((u for u in self._expected.values() if not u.future.done()), None)
+        else:
+            upload = self._expected.get(token)
+
+        if upload is None or upload.future.done():
+            log.warn('Rejecting unexpected upload')
+            raise web.HTTPNotFound()
+
+        filename = upload.filename
+        try:
+            reader = await request.multipart()
+            part = await reader.next()
+            while part is not None and part.name != 'file':
+                part = await reader.next()
+
+            if part is None:
+                raise RuntimeError('No file in upload')
+
+            progress = TransferProgress(
+                'Receiving %s' % os.path.basename(filename),
+                request.content_length
+            )
+            upload.progress = progress
+
+            # Replace, rather than overwrite, any existing file, as it
+            # may be linked from the results cache
+            partial = '%s.part' % filename
+            with open(partial, 'wb') as f:
+                while True:
+                    chunk = await part.read_chunk(self._chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    progress.update(len(chunk))
+                    for consumer in upload.consumers:
+                        await consumer(chunk)
+            os.replace(partial, filename)
+            progress.finish()
+
+            log.debug('Received %d bytes at %s/s' % (progress.count, _format_bytes(progress.throughput())))
+            if not upload.future.done():
+                upload.future.set_result(filename)
+        except:
+            log.exception('Could not receive file')
+            if not upload.future.done():
+                upload.future.set_result(None)
+
+        return web.Response(body=b"Accepted")
+
+    async def close(self):
+        for upload in list(self._expected.values()):
+            upload.cancel()
+        await self._runner.cleanup()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Run against the source tree, whether or not glot is installed
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -0,0 +1,67 @@
+import asyncio
+import os
+
+import lxml.etree
+import txaio
+
+import glot.actions
+
+
+def test_results_leaves_destination_for_later_commands():
+    actor = glot.actions.GlotActor(False, False, None, False, False)
+    actor.set_log(txaio.make_logger())
+
+    async def request_archive(call, guid, target, filename, consumer=None):
+        return True, filename
+
+    actor._request_archive = request_archive
+
+    asyncio.run(actor.results('ABC', None, False, False))
+
+    # A later inspect in the same session must not default to '.'
+    assert actor._destination is None
+
+
+def _launch_locations(tmp_path, shared_path, tmp_directory):
+    actor = glot.actions.GlotActor(False, False, None, False, False, shared_path=shared_path)
+    actor.set_log(txaio.make_logger())
+
+    settings = []
+
+    async def mc(suffix, *args, minapi='A0.0'):
+        if suffix == 'update_settings_xml':
+            settings.append(lxml.etree.fromstring(args[1]))
+        return True
+
+    actor.set_make_call(mc)
+
+    definition = tmp_path / 'start.sif'
+    definition.write_text('')
+    gssa_xml = b'<simulation><transferrer/><definition/></simulation>'
+
+    asyncio.run(actor.launch(gssa_xml, '.', tmp_directory, [], [str(definition)]))
+
+    return os.path.dirname(settings[0].find('.//definition').get('location'))
+
+
+def test_launch_points_at_shared_directory(tmp_path):
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+
+    assert _launch_locations(tmp_path, '%s:/remote' % shared, None) == '/remote'
+
+
+def test_launch_tmp_directory_overrides_shared_directory(tmp_path):
+    shared, elsewhere = tmp_path / 'shared', tmp_path / 'elsewhere'
+    shared.mkdir()
+    elsewhere.mkdir()
+
+    location = _launch_locations(tmp_path, '%s:/remote' % shared, str(elsewhere))
+    assert location == '/tmp/gssa-transferrer'
+
+
+def test_archive_entry_accepts_paths(tmp_path):
+    member = tmp_path / 'mesh.msh'
+    member.write_bytes(b'mesh')
+
+    assert glot.actions._archive_entry(member) == ('mesh.msh', str(member), None, 4)
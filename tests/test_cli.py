@@ -0,0 +1,103 @@
+import importlib.machinery
+import importlib.util
+import os
+
+import click.testing
+import pytest
+
+import glot.actions
+import glot.connector
+
+_script = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'glot')
+
+
+def _load_script():
+    loader = importlib.machinery.SourceFileLoader('glot_script', _script)
+    spec = importlib.util.spec_from_loader('glot_script', loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+class StubConnection:
+    """Stands in for GlotConnection, answering calls from `replies`"""
+
+    replies = {}
+
+    def __init__(self, runner, **kwargs):
+        self.calls = []
+        self.response = None
+
+    async def session(self):
+        return self
+
+    async def run(self, action, actor, **kwargs):
+        return await action(actor, **kwargs)
+
+    async def execute_call(self, suffix, *args, minapi='A0.0'):
+        self.calls.append((suffix,) + args)
+        result = self.replies.get(suffix)
+        self.response = result
+        return result
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def glot_cli(monkeypatch):
+    monkeypatch.setattr(glot.connector, 'GlotConnection', StubConnection)
+    monkeypatch.setattr(StubConnection, 'replies', {})
+    return _load_script().cli
+
+
+@pytest.mark.parametrize('args,replies', [
+    (['cancel', 'ABC'], {'cancel': True}),
+    (['cancel', 'ABC'], {'cancel': False}),
+    (['logs', 'ABC'], {'logs': {'stdout': 'out', 'stderr': 'err'}}),
+    (['status', 'ABC'], {'search': {}}),
+])
+def test_network_command_has_log(glot_cli, args, replies):
+    StubConnection.replies.update(replies)
+
+    result = click.testing.CliRunner().invoke(glot_cli, args, obj={})
+
+    assert result.exception is None, result.output
+    assert result.exit_code == 0
+
+
+def test_status_csv_matches_search_fields(glot_cli):
+    StubConnection.replies['retrieve_status'] = {
+        'finalized': True,
+        'status': {'timestamp': 1.5, 'percentage': 100, 'message': 'done'},
+        'exit_status': [True, 'SUCCESS']
+    }
+
+    result = click.testing.CliRunner().invoke(glot_cli, ['status', '--format', 'csv', 'abc'], obj={})
+
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines()[-2:] == [
+        'guid,finalized,timestamp,percentage,message,success',
+        'ABC,True,1.5,100.0,done,True'
+    ]
+
+
+def test_results_summary_needs_local_transfer(glot_cli):
+    result = click.testing.CliRunner().invoke(glot_cli, ['results', '-s', 'npz', '-t', 'http://host', 'ABC'], obj={})
+
+    assert result.exit_code == 2
+    assert '--target' in result.output
+
+
+def test_results_dispatches(glot_cli, monkeypatch):
+    requested = []
+
+    async def results(self, guid, target, include_diagnostic, inspect_diagnostic, summary_format=None):
+        requested.append((guid, target, summary_format))
+
+    monkeypatch.setattr(glot.actions.GlotActor, 'results', results)
+
+    result = click.testing.CliRunner().invoke(glot_cli, ['results', '-t', 'http://host', 'ABC'], obj={})
+
+    assert result.exit_code == 0, result.output
+    assert requested == [('ABC', 'http://host', None)]
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+from autobahn.wamp.exception import ApplicationError
+
+import glot.connector
+
+
+class RefusingSession:
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, procedure, *args):
+        self.calls.append(procedure)
+        raise ApplicationError('com.gosmartsimulation.error', 'refused')
+
+
+def test_refused_call_raises():
+    connection = glot.connector.GlotConnection(None)
+    connection._session = session = RefusingSession()
+
+    with pytest.raises(ApplicationError):
+        asyncio.run(connection.execute_call('init', 'GUID', minapi=None))
+
+    # Refusals are not retried
+    assert session.calls == ['com.gosmartsimulation.init']
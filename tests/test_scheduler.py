@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+import txaio
+
+import glot.actions
+import glot.scheduler
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return glot.scheduler.LaunchQueue(str(tmp_path / 'queue.json'))
+
+
+def test_add_refuses_missing_file(queue, tmp_path):
+    with pytest.raises(RuntimeError):
+        queue.add(0, str(tmp_path / 'missing.xml'), '.', None, [], [])
+
+    assert queue.entries() == []
+
+
+def test_failed_launch_does_not_block_queue(queue, tmp_path):
+    bad = tmp_path / 'bad.xml'
+    good = tmp_path / 'good.xml'
+    for path in (bad, good):
+        path.write_text('<simulation/>')
+
+    queue.add(1, str(bad), '.', None, [], [])
+    queue.add(0, str(good), '.', None, [], [])
+
+    actor = glot.actions.GlotActor(False, False, None, False, False)
+    actor.set_log(txaio.make_logger())
+
+    launched = []
+
+    async def launch(gssa_xml, *args):
+        if gssa_xml == str(bad):
+            raise RuntimeError("launch failed")
+        launched.append(gssa_xml)
+        return 'GUID'
+
+    async def running(server_limit):
+        return 0
+
+    actor.launch = launch
+    actor._running = running
+
+    asyncio.run(actor.queue_run(queue, 4, 0, 100, False, max_attempts=2))
+
+    assert launched == [str(good)]
+    assert queue.entries() == []
@@ -0,0 +1,60 @@
+import asyncio
+import io
+import tarfile
+
+import pytest
+
+import glot.summary
+
+
+def test_archive_guid_keeps_dashes():
+    guid = '7200887C-CB79-11E5-9A2C-0242AC110002'
+
+    assert glot.summary.archive_guid('/tmp/%s-results.tgz' % guid) == guid
+    assert glot.summary.archive_guid('%s-diagnostic.tgz' % guid) == guid
+    assert glot.summary.summary_filename('out/%s-results.tgz' % guid, 'parquet') == 'out/%s-summary.parquet' % guid
+
+
+def _archive(rows):
+    content = ('time,temperature\n' + ''.join('%d,%d\n' % (i, 2 * i) for i in range(rows))).encode('utf-8')
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as t:
+        member = tarfile.TarInfo('output/probe.csv')
+        member.size = len(content)
+        t.addfile(member, io.BytesIO(content))
+
+    return buffer.getvalue()
+
+
+async def _feed(stream, data, chunk_size=1024):
+    for i in range(0, len(data), chunk_size):
+        await stream.feed(data[i:i + chunk_size])
+
+
+def test_streaming_summary(tmp_path):
+    pytest.importorskip('numpy')
+    data = _archive(1000)
+    stream = glot.summary.StreamingSummary('ABC', str(tmp_path / 'ABC-summary.npz'))
+
+    async def run():
+        # Trailing padding after the end of the tar must not block us
+        await _feed(stream, data + b'\0' * 2 ** 20)
+        return await stream.finish()
+
+    assert asyncio.run(run()) == 2
+    assert not stream._thread.is_alive()
+
+
+def test_truncated_stream_is_closed(tmp_path):
+    pytest.importorskip('numpy')
+    data = _archive(1000)
+    stream = glot.summary.StreamingSummary('ABC', str(tmp_path / 'ABC-summary.npz'))
+
+    async def run():
+        await _feed(stream, data[:len(data) // 2])
+        await stream.close()
+
+    asyncio.run(run())
+
+    assert not stream._thread.is_alive()